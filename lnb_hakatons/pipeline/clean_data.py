@@ -2,21 +2,33 @@
 Data cleaning pipeline for Latvian National Library art criticism records.
 
 This script processes MARC bibliographic data from the Digital Library,
-cleaning and harmonizing review records for analysis.
+cleaning and harmonizing review records for analysis. The input file is
+processed in batches, so memory use does not grow with the size of the file.
 
 Usage:
-    uv run python lnb_hakatons/pipeline/clean_data.py
+    uv run python lnb_hakatons/pipeline/clean_data.py [--csv]
 
 Input: data/Mākslu kritika/cleaned-records-33-wide.csv
 Output:
-    - data/cleaned/recenzijas_clean.csv (filtered and processed data)
-    - data/cleaned/recenzijas_filtered_out.csv (data that was filtered out for inspection)
+    - data/cleaned/recenzijas_clean.parquet (filtered and processed data)
+    - data/cleaned/recenzijas_filtered_out.parquet (data that was filtered out for inspection)
+    - with --csv, the same data is also saved as .csv files next to the parquet files
 """
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import re
+import argparse
 import logging
-from typing import Dict, List, Optional, Union
+import multiprocessing
+import os
+from collections import Counter, defaultdict
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from pyarrow import csv as pacsv
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
 from lnb_hakatons import PROJECT_DIR
 
@@ -27,9 +39,11 @@ logger = logging.getLogger(__name__)
 ## Main variables
 DATA_DIR = PROJECT_DIR / "data/Mākslu kritika"
 DATA_FILE = "cleaned-records-33-wide.csv"
-OUTPUT_PATH = PROJECT_DIR / "data/cleaned/recenzijas_clean.csv"
-FILTERED_OUT_PATH = PROJECT_DIR / "data/cleaned/recenzijas_filtered_out.csv"
+OUTPUT_PATH = PROJECT_DIR / "data/cleaned/recenzijas_clean.parquet"
+FILTERED_OUT_PATH = PROJECT_DIR / "data/cleaned/recenzijas_filtered_out.parquet"
 KEEP_OTHER_COLUMNS = True # keep columns that are not processed and explicitly dropped
+N_WORKERS = None # number of processes for expanding MARC columns (None = number of CPUs)
+BATCH_SIZE_BYTES = 8 * 1024 * 1024 # size of the input blocks that are processed at once
 
 ## Helper variables
 # Lauki, kurus ņemam ārā
@@ -63,9 +77,37 @@ key_columns = [
     "PRIEKŠMETS - INSTITŪCIJA (610)",
 ]
 
+# Personu vārdu lauki (apvienojam kolonnā visas_personas)
+person_name_columns = [
+    "AUTORS (100)_a",
+    "PAPILDRAKSTS (700)_a",
+    "PAPILDRAKSTS - 2 (700)_a",
+    "NEKONTROLĒTS PERSONAS VĀRDS (720)_a",
+    "NEKONTROLĒTS PERSONAS VĀRDS - 2 (720)_a",
+    "NEKONTROLĒTS PERSONAS VĀRDS - 3 (720)_a",
+    "NEKONTROLĒTS PERSONAS VĀRDS - 4 (720)_a",
+    "NEKONTROLĒTS PERSONAS VĀRDS - 5 (720)_a",
+]
+
+# Lauki ar nedaudz atšķirīgām vērtībām (glabājam kā category)
+categorical_columns = [
+    "AUTORS (100)_4",
+    "PRIEKŠMETS - ŽANRS (655)_a",
+    "PRIEKŠMETS - ŽANRS (655)_x",
+]
+
+# Skaitliskie lauki (pārējos laukus lasām kā tekstu)
+numeric_columns = [
+    "GADS (008)",
+]
+
 # Autoru tipi, kurus analizējam
 AUTORS_100_4_values = ["aut", "rev"]
 
+# Iemesli, kāpēc ieraksts izfiltrēts
+AUTHOR_FILTER_REASON = "Author type not 'aut' or 'rev'"
+REVIEW_FILTER_REASON = "Not a review, book review, or history/criticism"
+
 # Literatūras "žanri"
 literature_categories = [
     'Grāmatu apskati',
@@ -122,6 +164,7 @@ literature_categories = [
     'Vācu proza',
     'Amerikāņu lugas',
  ]
+LITERATURE_CATEGORIES = frozenset(literature_categories)
 
 final_processed_columns = [
     "AUTORS (100)_4", # author type; just need rev and aut
@@ -165,6 +208,38 @@ final_processed_columns = [
     "PRIEKŠMETS - INSTITŪCIJA (610)_g", # institution type
 ]
 
+# Columns added by the processing (in the order they are added)
+added_columns = [
+    "visas_personas", # all person names, as a list
+    "RAKSTA NOSAUKUMS (245)_ab", # title and sub-title
+    "recenzeta_darba_autors", # harmonised author of the reviewed work
+    "recenzetais_darbs", # harmonised title of the reviewed work
+    "publicetajs_vai_institucija", # harmonised publisher or institution
+    "recenzijas_tips", # review type
+]
+
+# Regular expressions used by the helper functions (compiled once)
+# $$ followed by single character subfield code and content
+_MARC_SUBFIELD_RE = re.compile(r'\$\$([a-z0-9])([^$]*)')
+# surname (including hyphens, spaces, apostrophes, periods) followed by comma and first name
+_NAME_SPLIT_RE = re.compile(r'([^,]+),\s*([^,]+)')
+# opening parenthesis and director title
+_DIRECTOR_TITLE_RE = re.compile(
+    r'\((?:rež(?:isors?|isore?|isori|isores?|\.)|режиссёр(?:а|ы|ом|у|е|ов|ям|ями|ях)?|режиссер(?:а|ы|ом|у|е|ов|ям|ями|ях)?)',
+    re.IGNORECASE,
+)
+_WS_RE = re.compile(r'\s+')
+# text between the first colon and the next colon or comma
+_AFTER_COLON_RE = re.compile(r':([^:,]*)')
+# content in double quotes
+_QUOTED_RE = re.compile(r'"([^"]+)"')
+# author in curly braces
+_BRACE_RE = re.compile(r'\{([^}]+)\}')
+# title between } and /
+_SLASH_TITLE_RE = re.compile(r'\}\s*([^/]+?)\s*/')
+# publisher between colon after slash and comma
+_PUB_RE = re.compile(r'/\s*[^:]*:\s*([^,]+)')
+
  ## Helper functions
 def parse_marc_subfields(text: Union[str, None]) -> Dict[str, str]:
     """
@@ -176,12 +251,16 @@ def parse_marc_subfields(text: Union[str, None]) -> Dict[str, str]:
     Returns:
         dict: Dictionary with subfield codes as keys and content as values
     """
-    if pd.isna(text) or text == 'NA':
+    # Cheap checks first: most values are strings, and many have no subfields at all
+    # (this also covers empty and 'NA' values)
+    if not isinstance(text, str):
+        if pd.isna(text):
+            return {}
+        text = str(text)
+    if "$$" not in text:
         return {}
 
-    # Pattern to match $$ followed by single character and content
-    pattern = r'\$\$([a-z0-9])([^$]*)'
-    matches = re.findall(pattern, str(text))
+    matches = _MARC_SUBFIELD_RE.findall(text)
 
     result = {}
     for code, content in matches:
@@ -202,25 +281,25 @@ def expand_marc_columns(df: pd.DataFrame, column_name: str, prefix: Optional[str
         prefix: Optional prefix for new column names
 
     Returns:
-        DataFrame: Original DataFrame with new MARC subfield columns
+        DataFrame: New MARC subfield columns, with the same index as df
     """
     if prefix is None:
         prefix = column_name
 
-    # Parse all MARC subfields in the column
-    parsed_data = df[column_name].apply(parse_marc_subfields)
-
-    # Collect all unique subfield codes
-    all_codes = set()
-    for subfields in parsed_data:
-        all_codes.update(subfields.keys())
-
-    # Create new columns for each subfield code
-    for code in sorted(all_codes):
-        new_col_name = f"{prefix}_{code}"
-        df[new_col_name] = parsed_data.apply(lambda x: x.get(code, None))
-
-    return df
+    # Parse all MARC subfields in the column in one pass, collecting the values
+    # of each subfield code by row position
+    n_rows = len(df)
+    subfield_values = defaultdict(lambda: [None] * n_rows)
+    for i, text in enumerate(df[column_name].to_numpy()):
+        for code, content in parse_marc_subfields(text).items():
+            subfield_values[code][i] = content
+
+    # Create new columns for each subfield code (as Arrow-backed strings, like the input columns)
+    return pd.DataFrame(
+        {f"{prefix}_{code}": subfield_values[code] for code in sorted(subfield_values)},
+        index=df.index,
+        dtype=pd.StringDtype("pyarrow"),
+    )
 
 
 
@@ -244,11 +323,8 @@ def change_name_pattern(text: Union[str, None]) -> Union[str, None]:
     if pd.isna(text) or not text:
         return text
 
-    # Pattern to match surname (including hyphens, spaces, apostrophes, periods) followed by comma and first name
     # [^,]+ matches everything up to the comma (handles complex surnames)
-    pattern = r'([^,]+),\s*([^,]+)'
-
-    match = re.search(pattern, text.strip())
+    match = _NAME_SPLIT_RE.search(text.strip())
     if match:
         surname = match.group(1).strip()
         first_name = match.group(2).strip()
@@ -257,6 +333,23 @@ def change_name_pattern(text: Union[str, None]) -> Union[str, None]:
     return text
 
 
+def map_unique(values: pd.Series, func: Callable[[str], Optional[str]]) -> pd.Series:
+    """
+    Apply a function to each unique value only once and map the results back to all rows.
+
+    Useful for columns with many repeated values, such as author names.
+
+    Args:
+        values: Series to transform
+        func: Function applied to each unique non-empty value
+
+    Returns:
+        Series with the transformed values, missing and empty values become NaN
+    """
+    mapping = {value: func(value) for value in values.dropna().unique() if value != ""}
+    return values.map(mapping)
+
+
 
 def create_uncontrolled_name_columns() -> List[str]:
     """Create sub-field columns for uncontrolled name fields"""
@@ -292,9 +385,7 @@ def extract_director_from_245(text: Union[str, None]) -> Optional[str]:
         return None
 
     # First, find the opening parenthesis and director title
-    director_title_pattern = r'\((?:rež(?:isors?|isore?|isori|isores?|\.)|режиссёр(?:а|ы|ом|у|е|ов|ям|ями|ях)?|режиссер(?:а|ы|ом|у|е|ов|ям|ями|ях)?)'
-
-    match = re.search(director_title_pattern, text, re.IGNORECASE)
+    match = _DIRECTOR_TITLE_RE.search(text)
     if not match:
         return None
 
@@ -331,7 +422,7 @@ def extract_director_from_245(text: Union[str, None]) -> Optional[str]:
     for director in directors_text.split(','):
         director = director.strip()
         # Clean up the name (remove extra spaces, normalize)
-        director = re.sub(r'\s+', ' ', director)
+        director = _WS_RE.sub(' ', director)
         if director:  # Only add non-empty names
             directors.append(director)
 
@@ -339,319 +430,389 @@ def extract_director_from_245(text: Union[str, None]) -> Optional[str]:
     return directors if directors else None
 
 
-def extract_title_from_245(text: Union[str, None]) -> Optional[str]:
+def vec_extract_title_from_245(texts: pd.Series) -> pd.Series:
     """
-    Extract title from MARC (245)_b subfield text.
+    Extract titles from MARC (245)_b subfield texts.
 
-    Looks for the first phrase in double quotes, typically after words like "filma", "izrāde", etc.
+    Takes the first phrase in double quotes, typically after words like "filma", "izrāde", etc.
 
     Args:
-        text: The text from (245)_b subfield
+        texts: Series with the text from (245)_b subfield
 
     Returns:
-        Title if found, None otherwise
+        Series with titles, or None where no title is found
     """
-    if pd.isna(text) or not text:
-        return None
-
-    # Pattern to match content in double quotes
-    # Looks for the first occurrence of text in quotes
-    title_pattern = r'"([^"]+)"'
-
-    match = re.search(title_pattern, text)
-    if match:
-        title = match.group(1).strip()
-        return title
+    return texts.str.extract(_QUOTED_RE, expand=False).str.strip()
 
-    return None
 
-
-def extract_author_from_500(text: Union[str, None]) -> Optional[str]:
+def vec_extract_author_from_500(texts: pd.Series) -> pd.Series:
     """
-    Extract author from MARC (500)_a field text.
+    Extract authors from MARC (500)_a field texts.
 
-    Looks for author name in curly braces {Surname, Name.} format.
-    Removes trailing full stop from the name.
+    Takes the author name in curly braces {Surname, Name.}, removes the trailing
+    full stop and changes the name to "Name Surname" format.
 
     Args:
-        text: The text from (500)_a field
+        texts: Series with the text from (500)_a field
 
     Returns:
-        Author name if found, None otherwise
+        Series with author names in "Name Surname" format, or None where no author is found
     """
-    if pd.isna(text) or not text:
-        return None
+    authors = texts.str.extract(_BRACE_RE, expand=False).str.strip().str.rstrip(".")
+    # (the same authors are often reviewed many times, so each name is reformatted once)
+    return map_unique(authors, change_name_pattern)
 
-    # Pattern to match author in curly braces
-    author_pattern = r'\{([^}]+)\}'
 
-    match = re.search(author_pattern, text)
-    if match:
-        author = match.group(1).strip()
-        # Remove trailing full stop if present
-        author = author.rstrip('.')
-        # Apply name pattern change (Surname, Name -> Name Surname)
-        author = change_name_pattern(author)
-        return author
-
-    return None
-
-
-def extract_title_from_500(text: Union[str, None]) -> Optional[str]:
+def vec_extract_title_from_500(texts: pd.Series) -> pd.Series:
     """
-    Extract title from MARC (500)_a field text.
+    Extract titles from MARC (500)_a field texts.
 
-    Looks for title between closing brace } and slash /.
+    Takes the title between the closing brace } and slash /.
 
     Args:
-        text: The text from (500)_a field
+        texts: Series with the text from (500)_a field
 
     Returns:
-        Title if found, None otherwise
+        Series with titles, or None where no title is found
     """
-    if pd.isna(text) or not text:
-        return None
+    titles = texts.str.extract(_SLASH_TITLE_RE, expand=False).str.strip()
+    return titles.str.replace(_WS_RE, " ", regex=True)
 
-    # Pattern to match title between } and /
-    title_pattern = r'\}\s*([^/]+?)\s*/'
 
-    match = re.search(title_pattern, text)
-    if match:
-        title = match.group(1).strip()
-        # Clean up title (remove extra spaces, normalize)
-        title = re.sub(r'\s+', ' ', title)
-        return title
+def vec_extract_publisher_from_500(texts: pd.Series) -> pd.Series:
+    """
+    Extract publishers from MARC (500)_a field texts.
 
-    return None
+    Takes the publisher between the colon after the slash and the comma.
 
+    Args:
+        texts: Series with the text from (500)_a field
 
-def extract_publisher_from_500(text: Union[str, None]) -> Optional[str]:
+    Returns:
+        Series with publishers, or None where no publisher is found
     """
-    Extract publisher from MARC (500)_a field text.
+    publishers = texts.str.extract(_PUB_RE, expand=False).str.strip()
+    return publishers.str.replace(_WS_RE, " ", regex=True)
 
-    Looks for publisher between colon after slash and comma.
+
+def vec_text_after_colon(texts: pd.Series) -> pd.Series:
+    """
+    Take the text between the first colon and the next comma (e.g. "Rīga : Zvaigzne, 2010" -> "Zvaigzne").
 
     Args:
-        text: The text from (500)_a field
+        texts: Series with publisher or institution names
 
     Returns:
-        Publisher if found, None otherwise
+        Series with the text after the colon, or the original value if there is no colon
     """
-    if pd.isna(text) or not text:
-        return None
+    after_colon = texts.str.extract(_AFTER_COLON_RE, expand=False).str.strip()
+    return after_colon.where(texts.str.contains(":", regex=False, na=False), texts)
 
-    # Pattern to match publisher between colon after slash and comma
-    # First find the slash, then look for colon after it, then capture until comma
-    publisher_pattern = r'/\s*[^:]*:\s*([^,]+)'
-
-    match = re.search(publisher_pattern, text)
-    if match:
-        publisher = match.group(1).strip()
-        # Clean up publisher (remove extra spaces, normalize)
-        publisher = re.sub(r'\s+', ' ', publisher)
-        return publisher
-
-    return None
 
 
+def process_batch(
+    data_df: pd.DataFrame,
+    final_columns_all: List[str],
+    executor: Optional[ProcessPoolExecutor] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Expand, filter and harmonize one batch of the input records.
 
-if __name__ == "__main__":
-    ## Load the data
-    data_df = (
-        pd.read_csv(DATA_DIR / DATA_FILE, sep=';')
-        .drop(columns=columns_to_remove, axis=1)
-    )
+    Args:
+        data_df: Batch of the input data
+        final_columns_all: Columns to keep from the data with expanded MARC columns
+        executor: Process pool used to expand the MARC columns (None = expand them in this process)
 
+    Returns:
+        Tuple of the processed reviews and the filtered-out rows (with a filter_reason column)
+    """
     ## Expand MARC columns
     # Create a simplified version of the data with expanded MARC columns
-    simplified_df = data_df.copy()
-
-    for col in key_columns:
-        if col in simplified_df.columns:
-            simplified_df = expand_marc_columns(simplified_df, col)
-
-    # Keep the rest of the columns
-    keep_columns = list(set(data_df.columns).difference(set(key_columns)))
-
-    # Add all the new MARC subfield columns
-    marc_columns = [col for col in simplified_df.columns if '_' in col]
-    all_columns = keep_columns + marc_columns
-
-    # Create the simplified dataframe
-    simplified_df = simplified_df[all_columns]
-
-    final_columns = final_processed_columns + create_uncontrolled_name_columns()
-
-    # Add rest of the columns
-    if KEEP_OTHER_COLUMNS:
-        final_columns_all = final_columns + sorted(keep_columns)
-    else:
-        final_columns_all = final_columns
-
-    final_columns_all = [col for col in final_columns_all if col in simplified_df.columns]
+    # (the columns are independent, so with a process pool they are parsed in parallel
+    # processes; each process only gets the one column it expands)
+    marc_input_columns = [col for col in key_columns if col in data_df.columns]
+    map_func = executor.map if executor is not None else map
+    marc_subfield_dfs = list(map_func(
+        expand_marc_columns,
+        [data_df[[col]] for col in marc_input_columns],
+        marc_input_columns,
+    ))
+    # Columns that do not occur in this batch (e.g. rare subfields) are added as empty
+    # string columns, so that all batches have the same columns and dtypes
+    available_columns = set(data_df.columns).union(*(df.columns for df in marc_subfield_dfs))
+    empty_columns = pd.DataFrame(
+        None,
+        index=data_df.index,
+        columns=[col for col in final_columns_all if col not in available_columns],
+        dtype=pd.StringDtype("pyarrow"),
+    )
+    # Add all subfield columns in one concat (without copying the data again); the
+    # column selection and .assign below copy the data into consolidated blocks
+    simplified_df = pd.concat([data_df, *marc_subfield_dfs, empty_columns], axis=1, copy=False)
 
     ## Filtering
-    # Filter by author type
-    logger.info(f"Original number of rows: {len(data_df)}")
+    # Select the columns for filtering operations (the filters below make their own copies)
+    working_df = simplified_df.loc[:, final_columns_all]
 
-    # Create a copy for filtering operations
-    working_df = simplified_df.copy()[final_columns_all]
+    # Store low-cardinality columns as categories (smaller, and filters only check the categories)
+    for col in categorical_columns:
+        if col in working_df.columns:
+            working_df[col] = working_df[col].astype("category")
 
     # First filter: author type
     author_filter = working_df["AUTORS (100)_4"].isin(AUTORS_100_4_values)
     filtered_by_author = working_df[author_filter]
     filtered_out_by_author = working_df[~author_filter]
 
-    logger.info(f"Number of rows after filtering authors: {len(filtered_by_author)}")
-    logger.info(f"Number of rows filtered out by author type: {len(filtered_out_by_author)}")
-
     # Second filter: review type
-    ir_recenzija = filtered_by_author["PRIEKŠMETS - ŽANRS (655)_a"].fillna("").str.lower().str.contains("recenzija")
-    ir_gramata = filtered_by_author["PRIEKŠMETS - ŽANRS (655)_a"].fillna("").str.lower().str.contains("grāmatu apskati")
-    ir_vesture = filtered_by_author["PRIEKŠMETS - ŽANRS (655)_x"].fillna("").str.lower().str.contains("vēsture un kritika")
+    # (one case-insensitive scan per column instead of lowercasing and scanning for each term)
+    ir_recenzija_vai_gramata = filtered_by_author["PRIEKŠMETS - ŽANRS (655)_a"].str.contains(
+        "recenzija|grāmatu apskati", case=False, regex=True, na=False
+    )
+    ir_vesture = filtered_by_author["PRIEKŠMETS - ŽANRS (655)_x"].str.contains(
+        "vēsture un kritika", case=False, regex=True, na=False
+    )
 
-    review_filter = ir_recenzija | ir_vesture | ir_gramata
+    review_filter = ir_recenzija_vai_gramata | ir_vesture
     final_df = filtered_by_author[review_filter]
     filtered_out_by_review = filtered_by_author[~review_filter]
 
-    logger.info(f"Number of rows after filtering recenzijas: {len(final_df)}")
-    logger.info(f"Number of rows filtered out by review type: {len(filtered_out_by_review)}")
-
     # Combine all filtered-out data
     all_filtered_out = pd.concat([
-        filtered_out_by_author.assign(filter_reason="Author type not 'aut' or 'rev'"),
-        filtered_out_by_review.assign(filter_reason="Not a review, book review, or history/criticism")
+        filtered_out_by_author.assign(filter_reason=AUTHOR_FILTER_REASON),
+        filtered_out_by_review.assign(filter_reason=REVIEW_FILTER_REASON)
     ], ignore_index=True)
 
-    logger.info(f"Total rows filtered out: {len(all_filtered_out)}")
-
     ## Processing
-
-    final_df = (
-        final_df
-        .assign(**{
-            # Change the format of the author from Surname, Name to Name Surname
-            "AUTORS (100)_a": lambda df: df["AUTORS (100)_a"].apply(
-                lambda val: change_name_pattern(val) if pd.notna(val) and val != "" else None
-            ),
-            "PAPILDRAKSTS (700)_a": lambda df: df["PAPILDRAKSTS (700)_a"].apply(
-                lambda val: change_name_pattern(val) if pd.notna(val) and val != "" else None
-            ),
-            "PAPILDRAKSTS - 2 (700)_a": lambda df: df["PAPILDRAKSTS - 2 (700)_a"].apply(
-                lambda val: change_name_pattern(val) if pd.notna(val) and val != "" else None
-            ),
-            "NEKONTROLĒTS PERSONAS VĀRDS (720)_a": lambda df: df["NEKONTROLĒTS PERSONAS VĀRDS (720)_a"].apply(
-                lambda val: change_name_pattern(val) if pd.notna(val) and val != "" else None
-            ),
-            "NEKONTROLĒTS PERSONAS VĀRDS - 2 (720)_a": lambda df: df["NEKONTROLĒTS PERSONAS VĀRDS - 2 (720)_a"].apply(
-                lambda val: change_name_pattern(val) if pd.notna(val) and val != "" else None
-            ),
-            "NEKONTROLĒTS PERSONAS VĀRDS - 3 (720)_a": lambda df: df["NEKONTROLĒTS PERSONAS VĀRDS - 3 (720)_a"].apply(
-                lambda val: change_name_pattern(val) if pd.notna(val) and val != "" else None
-            ),
-            "NEKONTROLĒTS PERSONAS VĀRDS - 4 (720)_a": lambda df: df["NEKONTROLĒTS PERSONAS VĀRDS - 4 (720)_a"].apply(
-                lambda val: change_name_pattern(val) if pd.notna(val) and val != "" else None
-            ),
-            "NEKONTROLĒTS PERSONAS VĀRDS - 5 (720)_a": lambda df: df["NEKONTROLĒTS PERSONAS VĀRDS - 5 (720)_a"].apply(
-                lambda val: change_name_pattern(val) if pd.notna(val) and val != "" else None
-            ),
-            # Combine all authors into one column as a list
-            "visas_personas": lambda df: df[["AUTORS (100)_a", "PAPILDRAKSTS (700)_a", "PAPILDRAKSTS - 2 (700)_a", "NEKONTROLĒTS PERSONAS VĀRDS (720)_a", "NEKONTROLĒTS PERSONAS VĀRDS - 2 (720)_a", "NEKONTROLĒTS PERSONAS VĀRDS - 3 (720)_a", "NEKONTROLĒTS PERSONAS VĀRDS - 4 (720)_a", "NEKONTROLĒTS PERSONAS VĀRDS - 5 (720)_a"]].apply(
-                lambda row: [val for val in row if pd.notna(val) and val != ""],
-                axis=1
-            ),
-            # Combine subfields _a and _b
-            "RAKSTA NOSAUKUMS (245)_ab": lambda df: df["RAKSTA NOSAUKUMS (245)_a"].fillna("") + " " + df["RAKSTA NOSAUKUMS (245)_b"].fillna(""),
-            # Remove full stops in genre
-            "PRIEKŠMETS - ŽANRS (655)_a": lambda df: df["PRIEKŠMETS - ŽANRS (655)_a"].str.replace(".", "").str.strip(),
-            "PRIEKŠMETS - INSTITŪCIJA (610)_a": lambda df: df["PRIEKŠMETS - INSTITŪCIJA (610)_a"].str.replace(".", "").str.strip(),
-        })
-        .assign(**{
-            # remove colon from the end of the title (only the end - there might be a space before and/or after)
-            "RAKSTA NOSAUKUMS (245)_a": lambda df: df["RAKSTA NOSAUKUMS (245)_a"].fillna("").str.rstrip(": /").str.strip(),
-        })
-        .assign(**{
-            # Replace only exact matches of "Latvijas Nacionālā opera" with "Latvijas Nacionālā opera un balets"
-            "PRIEKŠMETS - INSTITŪCIJA (610)_a": lambda df: df["PRIEKŠMETS - INSTITŪCIJA (610)_a"].apply(
-                lambda val: "Latvijas Nacionālā opera un balets" if val == "Latvijas Nacionālā opera" else val
-            )
-        })
-        # Extract director and title from (245)_b
-        .assign(**{
-            "(245)_director": lambda df: df["RAKSTA NOSAUKUMS (245)_b"].apply(
-                lambda val: extract_director_from_245(val)
-            ),
-            "(245)_title": lambda df: df["RAKSTA NOSAUKUMS (245)_b"].apply(
-                lambda val: extract_title_from_245(val)
-            ),
-        })
-        # Extract book author, title, and publisher from (500)_a
-        .assign(**{
-            "(500)_author": lambda df: df["RECENZĒTAIS IZDEVUMS (500)_a"].apply(
-                lambda val: extract_author_from_500(val)
-            ),
-            "(500)_title": lambda df: df["RECENZĒTAIS IZDEVUMS (500)_a"].apply(
-                lambda val: extract_title_from_500(val)
-            ),
-            "(500)_publisher": lambda df: df["RECENZĒTAIS IZDEVUMS (500)_a"].apply(
-                lambda val: extract_publisher_from_500(val)
-            ),
-        })
-        # Book authors
-        # Populate 787 fields with extracted data (prioritize 787 over 500_a if available)
-        .assign(**{
-            "(787)_author": lambda df: df["RECENZĒTAIS IZDEVUMS (787)_a"].apply(
-                lambda val: change_name_pattern(val) if pd.notna(val) and val != "" else None
-            ).fillna(df["(500)_author"]),
-            "(787)_title": lambda df: df["RECENZĒTAIS IZDEVUMS (787)_t"].apply(
-                lambda val: val if pd.notna(val) and val != "" else None
-            ).fillna(df["(500)_title"]),
-            "(787)_publisher": lambda df: df["RECENZĒTAIS IZDEVUMS (787)_d"].apply(
-                lambda val: val if pd.notna(val) and val != "" else None
-            ).fillna(df["(500)_publisher"]),
-        })
+    # Helper columns for authors and titles are kept as local Series (only the
+    # harmonised columns go into the data), and all columns are added in a single
+    # .assign, so the DataFrame is copied once. Later items in .assign see the
+    # columns created or modified by earlier ones.
+
+    # Extract director and title from (245)_b
+    director_245 = final_df["RAKSTA NOSAUKUMS (245)_b"].apply(extract_director_from_245)
+    title_245 = vec_extract_title_from_245(final_df["RAKSTA NOSAUKUMS (245)_b"])
+
+    # Extract book author, title, and publisher from (500)_a
+    author_500 = vec_extract_author_from_500(final_df["RECENZĒTAIS IZDEVUMS (500)_a"])
+    title_500 = vec_extract_title_from_500(final_df["RECENZĒTAIS IZDEVUMS (500)_a"])
+    publisher_500 = vec_extract_publisher_from_500(final_df["RECENZĒTAIS IZDEVUMS (500)_a"])
+
+    # Book authors
+    # Populate 787 fields with extracted data (prioritize 787 over 500_a if available)
+    author_787 = map_unique(
+        final_df["RECENZĒTAIS IZDEVUMS (787)_a"], change_name_pattern
+    ).fillna(author_500)
+    title_787 = final_df["RECENZĒTAIS IZDEVUMS (787)_t"].fillna(title_500)
+    publisher_787 = final_df["RECENZĒTAIS IZDEVUMS (787)_d"].fillna(publisher_500)
+
+    final_df = final_df.assign(**{
+        # Change the format of the author from Surname, Name to Name Surname
+        "AUTORS (100)_a": lambda df: map_unique(df["AUTORS (100)_a"], change_name_pattern),
+        "PAPILDRAKSTS (700)_a": lambda df: map_unique(df["PAPILDRAKSTS (700)_a"], change_name_pattern),
+        "PAPILDRAKSTS - 2 (700)_a": lambda df: map_unique(df["PAPILDRAKSTS - 2 (700)_a"], change_name_pattern),
+        "NEKONTROLĒTS PERSONAS VĀRDS (720)_a": lambda df: map_unique(df["NEKONTROLĒTS PERSONAS VĀRDS (720)_a"], change_name_pattern),
+        "NEKONTROLĒTS PERSONAS VĀRDS - 2 (720)_a": lambda df: map_unique(df["NEKONTROLĒTS PERSONAS VĀRDS - 2 (720)_a"], change_name_pattern),
+        "NEKONTROLĒTS PERSONAS VĀRDS - 3 (720)_a": lambda df: map_unique(df["NEKONTROLĒTS PERSONAS VĀRDS - 3 (720)_a"], change_name_pattern),
+        "NEKONTROLĒTS PERSONAS VĀRDS - 4 (720)_a": lambda df: map_unique(df["NEKONTROLĒTS PERSONAS VĀRDS - 4 (720)_a"], change_name_pattern),
+        "NEKONTROLĒTS PERSONAS VĀRDS - 5 (720)_a": lambda df: map_unique(df["NEKONTROLĒTS PERSONAS VĀRDS - 5 (720)_a"], change_name_pattern),
+        # Combine all authors into one column as a list
+        # (loop over the underlying 2D array instead of a row-wise apply; object dtype, so
+        # that the column is not inferred as float in a batch without any rows)
+        "visas_personas": lambda df: pd.Series(
+            [
+                [val for val in row if isinstance(val, str) and val != ""]
+                for row in df[person_name_columns].to_numpy()
+            ],
+            index=df.index,
+            dtype=object,
+        ),
+        # Combine subfields _a and _b
+        "RAKSTA NOSAUKUMS (245)_ab": lambda df: df["RAKSTA NOSAUKUMS (245)_a"].fillna("") + " " + df["RAKSTA NOSAUKUMS (245)_b"].fillna(""),
+        # remove colon from the end of the title (only the end - there might be a space before and/or after)
+        "RAKSTA NOSAUKUMS (245)_a": lambda df: df["RAKSTA NOSAUKUMS (245)_a"].fillna("").str.rstrip(": /").str.strip(),
+        # Remove full stops in genre (plain substring replace, the column is categorical)
+        "PRIEKŠMETS - ŽANRS (655)_a": lambda df: df["PRIEKŠMETS - ŽANRS (655)_a"].str.replace(".", "", regex=False).str.strip(),
+        # Remove full stops in institution, then replace only exact matches of
+        # "Latvijas Nacionālā opera" with "Latvijas Nacionālā opera un balets"
+        "PRIEKŠMETS - INSTITŪCIJA (610)_a": lambda df: df["PRIEKŠMETS - INSTITŪCIJA (610)_a"].str.replace(".", "", regex=False).str.strip().replace(
+            {"Latvijas Nacionālā opera": "Latvijas Nacionālā opera un balets"}
+        ),
         # harmonized recenzeta_darba_autors un recenzetais_darbs to combine either 245 or 787
-        .assign(**{
-            "recenzeta_darba_autors": lambda df: df["(787)_author"].replace("", None).fillna(df["(245)_director"]),
-            "recenzetais_darbs": lambda df: df["(787)_title"].replace("", None).fillna(df["(245)_title"]),
-            "publicetajs_vai_institucija": lambda df: df["(787)_publisher"].replace("", None).fillna(df["PRIEKŠMETS - INSTITŪCIJA (610)_a"]),
-        })
-        # fix if there is still a colon in the publicetajs_vai_institucija then take the text between the colon and the next comma
-        .assign(**{
-            "publicetajs_vai_institucija": lambda df: df["publicetajs_vai_institucija"].apply(
-                lambda x: x.split(":")[1].split(",")[0].strip() if pd.notna(x) and ":" in str(x) else x
-            ),
-        })
+        "recenzeta_darba_autors": author_787.replace("", None).fillna(director_245),
         # try filling rezentais_darbs nulls with RECENZĒTĀ FILMA VAI IZRĀDE (630)_a
-        .assign(**{
-            "recenzetais_darbs": lambda df: df["recenzetais_darbs"].fillna(df["RECENZĒTĀ FILMA VAI IZRĀDE (630)_a"]),
-        })
-        .assign(**{
-            "recenzetais_darbs": lambda df: df["recenzetais_darbs"].str.split(":").str[0].str.strip(),
-        })
-        # if  PRIEKŠMETS - ŽANRS (655)_a is in literature_categories the use "Literatūra", otherwise keep the value
-        .assign(**{
-            "recenzijas_tips": lambda df: df["PRIEKŠMETS - ŽANRS (655)_a"].apply(
-                lambda val: "Literatūras recenzijas" if val in literature_categories else val
-            )
-        })
-        # drop the helper columns for authors and title, and keep only the harmonised columns
-        .drop(columns=[
-            "(245)_director",
-            "(245)_title",
-            "(500)_author",
-            "(500)_title",
-            "(500)_publisher",
-            "(787)_author",
-            "(787)_title",
-            "(787)_publisher",
-        ])
-    )
+        "recenzetais_darbs": lambda df: (
+            title_787.replace("", None).fillna(title_245)
+            .fillna(df["RECENZĒTĀ FILMA VAI IZRĀDE (630)_a"])
+            .str.split(":").str[0].str.strip()
+        ),
+        # fix if there is still a colon in the publicetajs_vai_institucija then take the text between the colon and the next comma
+        "publicetajs_vai_institucija": lambda df: vec_text_after_colon(
+            publisher_787.replace("", None).fillna(df["PRIEKŠMETS - INSTITŪCIJA (610)_a"])
+        ),
+        # if  PRIEKŠMETS - ŽANRS (655)_a is in literature_categories the use "Literatūra", otherwise keep the value
+        "recenzijas_tips": lambda df: df["PRIEKŠMETS - ŽANRS (655)_a"].mask(
+            df["PRIEKŠMETS - ŽANRS (655)_a"].isin(LITERATURE_CATEGORIES), "Literatūras recenzijas"
+        ),
+    })
 
-    ## Save the data
-    final_df.to_csv(OUTPUT_PATH, sep=',', index=False)
+    return final_df, all_filtered_out
 
-    # Save filtered-out data for inspection
-    all_filtered_out.to_csv(FILTERED_OUT_PATH, sep=',', index=False)
-    logger.info(f"Saved filtered-out data to: {FILTERED_OUT_PATH}")
 
+def open_output(path: Path, columns: List[str], write_csv: bool = False) -> pq.ParquetWriter:
+    """
+    Open a Parquet file for the processed batches (and optionally a CSV file next to it).
+
+    The files are created with all columns up front, so they exist even if there are no
+    rows. The numeric columns are stored as integers, visas_personas as a list of strings,
+    and all other columns as strings.
+
+    Args:
+        path: Path of the Parquet file
+        columns: Columns of the output, in order
+        write_csv: Whether to also create a CSV file (with just the header)
+
+    Returns:
+        Open Parquet writer
+    """
+    schema = pa.schema([
+        (
+            col,
+            pa.list_(pa.string()) if col == "visas_personas"
+            else pa.int64() if col in numeric_columns
+            else pa.string(),
+        )
+        for col in columns
+    ])
+    if write_csv:
+        pd.DataFrame(columns=columns).to_csv(path.with_suffix(".csv"), sep=',', index=False)
+    return pq.ParquetWriter(path, schema, compression="zstd")
+
+
+def write_batch(
+    df: pd.DataFrame,
+    path: Path,
+    writer: pq.ParquetWriter,
+    write_csv: bool = False,
+) -> None:
+    """
+    Append a processed batch to a Parquet file (and optionally to a CSV file next to it).
+
+    Args:
+        df: Processed batch
+        path: Path of the Parquet file
+        writer: Parquet writer opened with open_output
+        write_csv: Whether to also append the batch to the CSV file
+    """
+    writer.write_table(pa.Table.from_pandas(df, schema=writer.schema, preserve_index=False))
+
+    if write_csv:
+        df.to_csv(
+            path.with_suffix(".csv"),
+            sep=',',
+            index=False,
+            columns=writer.schema.names,
+            mode="a",
+            header=False,
+        )
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clean the art criticism review records.")
+    parser.add_argument("--csv", action="store_true", help="also save the output as CSV files")
+    args = parser.parse_args()
+
+    # (quoted values can span several lines)
+    parse_options = pacsv.ParseOptions(delimiter=';', newlines_in_values=True)
+
+    # Read only the columns that are used, as Arrow-backed strings (the column names are
+    # taken from PyArrow's own parse of the header, so they match the reader below)
+    with pacsv.open_csv(DATA_DIR / DATA_FILE, parse_options=parse_options) as header_reader:
+        input_columns = header_reader.schema.names
+    duplicate_columns = [col for col, count in Counter(input_columns).items() if count > 1]
+    if duplicate_columns:
+        raise ValueError(f"Duplicate column names in {DATA_FILE}: {duplicate_columns}")
+    needed_columns = [
+        col for col in input_columns
+        if col not in columns_to_remove and (KEEP_OTHER_COLUMNS or col in key_columns)
+    ]
+
+    # Keep the rest of the columns (in the order of the input file)
+    key_set = frozenset(key_columns)
+    keep_columns = [col for col in needed_columns if col not in key_set]
+
+    final_columns = final_processed_columns + create_uncontrolled_name_columns()
+
+    # Add rest of the columns
+    if KEEP_OTHER_COLUMNS:
+        final_columns_all = final_columns + keep_columns
+    else:
+        final_columns_all = final_columns
+
+    ## Load and process the data in batches
+    # The file is streamed in blocks of BATCH_SIZE_BYTES, and each processed batch is
+    # appended to the output files, so peak memory does not grow with the size of the
+    # input. (The streaming reader parses the blocks one by one in a single thread, which
+    # is slower than the multi-threaded read of the whole file, but keeps memory bounded.)
+    reader = pacsv.open_csv(
+        DATA_DIR / DATA_FILE,
+        read_options=pacsv.ReadOptions(block_size=BATCH_SIZE_BYTES),
+        parse_options=parse_options,
+        convert_options=pacsv.ConvertOptions(
+            include_columns=needed_columns,
+            column_types={
+                col: pa.int64() if col in numeric_columns else pa.string()
+                for col in needed_columns
+            },
+            strings_can_be_null=True,
+        ),
+    )
+
+    n_rows = 0
+    n_final = 0
+    n_filtered_out = Counter()
+    writers = {
+        OUTPUT_PATH: open_output(OUTPUT_PATH, final_columns_all + added_columns, write_csv=args.csv),
+        FILTERED_OUT_PATH: open_output(FILTERED_OUT_PATH, final_columns_all + ["filter_reason"], write_csv=args.csv),
+    }
+    # With a single worker, the MARC columns are expanded in this process, as sending
+    # the columns to a worker process costs more than it saves
+    n_workers = N_WORKERS or os.process_cpu_count() or 1
+    try:
+        # (worker processes are started by a fork server, as forking a process that
+        # already runs PyArrow's threads is unsafe)
+        with (
+            ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context("forkserver"))
+            if n_workers > 1 else nullcontext()
+        ) as executor:
+            for batch in reader:
+                data_df = batch.to_pandas(
+                    types_mapper={pa.string(): pd.StringDtype("pyarrow"), pa.int64(): pd.Int64Dtype()}.get
+                )
+                final_df, all_filtered_out = process_batch(data_df, final_columns_all, executor)
+
+                ## Save the data
+                write_batch(final_df, OUTPUT_PATH, writers[OUTPUT_PATH], write_csv=args.csv)
+                # Save filtered-out data for inspection
+                write_batch(all_filtered_out, FILTERED_OUT_PATH, writers[FILTERED_OUT_PATH], write_csv=args.csv)
+
+                n_rows += len(data_df)
+                n_final += len(final_df)
+                n_filtered_out.update(all_filtered_out["filter_reason"])
+                logger.info(f"Processed {n_rows} rows")
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    logger.info(f"Original number of rows: {n_rows}")
+    logger.info(f"Number of rows after filtering authors: {n_rows - n_filtered_out[AUTHOR_FILTER_REASON]}")
+    logger.info(f"Number of rows filtered out by author type: {n_filtered_out[AUTHOR_FILTER_REASON]}")
+    logger.info(f"Number of rows after filtering recenzijas: {n_final}")
+    logger.info(f"Number of rows filtered out by review type: {n_filtered_out[REVIEW_FILTER_REASON]}")
+    logger.info(f"Total rows filtered out: {n_filtered_out.total()}")
+
+    logger.info(f"Saved cleaned data to: {OUTPUT_PATH}")
+    logger.info(f"Saved filtered-out data to: {FILTERED_OUT_PATH}")
+    if args.csv:
+        logger.info(f"Saved CSV copies to: {OUTPUT_PATH.parent}")